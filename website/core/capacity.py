@@ -0,0 +1,112 @@
+"""
+Intake capacity tracking
+
+We can only take on so many meal and grocery requests each period (MEALS_LIMIT, GROCERIES_LIMIT).
+Counting request rows on every page view doesn't hold up when intake opens and everyone arrives at once,
+so instead each submission increments a counter (CapacityCounter, one row per day) and the period's total
+is cached, so checking capacity is usually a single cache read, regardless of how many requests have been made.
+
+Counters are incremented with an UPDATE ... SET count = count + n, so concurrent submissions can't lose each
+other's counts. Recording a submission clears the cached totals it affects, which only reaches every worker
+if the default cache is shared (the core.E001 system check enforces this).
+
+The period is the sum of the most recent PERIOD_DAYS counters, so old submissions slide out of it on their own.
+Because counters can drift from the requests themselves (e.g. when one is deleted), `manage.py reconcile_capacity`
+resets them from the database (see INTAKE_CAPACITY in settings), and should be scheduled to run periodically.
+
+Nothing is counted until the code that saves a submission calls Capacity.record(), and reconciling
+needs a "source". Until both exist, intake only closes when it's disabled in settings.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import CapacityCounter
+
+PERIOD_DAYS = 7
+# A total is cleared whenever a submission is recorded, but one computed while another was being recorded
+# could miss it, so don't keep totals for long
+TOTAL_TIMEOUT = 60
+
+
+class Capacity:
+    def __init__(self, name, limit, disabled=False, source=None):
+        self.name = name
+        self.limit = limit
+        self.disabled = disabled
+        self.source = source
+
+    def __repr__(self):
+        return f"<Capacity {self.name}: {self.limit}>"
+
+    def days(self, today=None):
+        today = today or timezone.localdate()
+        return [today - timedelta(days=offset) for offset in range(PERIOD_DAYS)]
+
+    def key(self, today):
+        """Cache key for the total of the period ending `today`"""
+        return f"capacity:{self.name}:{today.isoformat()}"
+
+    def clear_totals(self, days):
+        """Clear the cached totals of every period including any of `days`"""
+        cache.delete_many(
+            {
+                self.key(day + timedelta(days=offset))
+                for day in days
+                for offset in range(PERIOD_DAYS)
+            }
+        )
+
+    def record(self, amount=1, today=None):
+        """Count a new submission (e.g. one meal request, or a number of grocery boxes)"""
+        day = today or timezone.localdate()
+        # get_or_create copes with another submission creating the day's counter at the same moment
+        counter, _ = CapacityCounter.objects.get_or_create(name=self.name, day=day)
+        CapacityCounter.objects.filter(pk=counter.pk).update(count=F("count") + amount)
+        self.clear_totals([day])
+
+    def count(self, today=None):
+        today = today or timezone.localdate()
+        total = cache.get(self.key(today))
+        if total is None:
+            days = self.days(today)
+            counters = CapacityCounter.objects.filter(
+                name=self.name, day__range=(days[-1], days[0])
+            )
+            total = counters.aggregate(total=Sum("count"))["total"] or 0
+            cache.set(self.key(today), total, TOTAL_TIMEOUT)
+        return total
+
+    def remaining(self, today=None):
+        return max(self.limit - self.count(today), 0)
+
+    def is_open(self, today=None):
+        return not self.disabled and self.count(today) < self.limit
+
+    def reconcile(self, today=None):
+        """Reset the period's counters from the source of truth, returning the reconciled total"""
+        if self.source is None:
+            return None
+        days = self.days(today)
+        counts = import_string(self.source)(days[-1], days[0])
+        with transaction.atomic():
+            # Counters from before the period will never be counted again
+            CapacityCounter.objects.filter(name=self.name, day__lt=days[-1]).delete()
+            for day in days:
+                CapacityCounter.objects.update_or_create(
+                    name=self.name, day=day, defaults={"count": counts.get(day, 0)}
+                )
+        self.clear_totals(days)
+        return sum(counts.get(day, 0) for day in days)
+
+
+def get_capacities():
+    return {
+        name: Capacity(name, **options)
+        for name, options in settings.INTAKE_CAPACITY.items()
+    }
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches)
+def check_capacity_cache(app_configs, **kwargs):
+    """Cached intake capacity totals (core/capacity.py) go stale unless every worker shares them"""
+    if not settings.INTAKE_CAPACITY:
+        return []
+    backend = caches["default"]
+    if isinstance(backend, (LocMemCache, DummyCache)):
+        return [
+            Error(
+                f"Intake capacity totals are cached in the default cache, but {type(backend).__name__} "
+                "isn't shared between processes, so workers wouldn't see each other's submissions.",
+                hint="Configure a shared cache in CACHES, like DatabaseCache or memcached.",
+                id="core.E001",
+            )
+        ]
+    return []
@@ -1,5 +1,7 @@
 from django.conf import settings as django_settings
 
+from .capacity import get_capacities
+
 
 # Expose Django settings through the settings context in templates
 def settings(request):
@@ -22,3 +24,9 @@ def settings(request):
             name: getattr(django_settings, name) for name in SETTINGS_ALLOWED_LIST
         }
     }
+
+
+# Expose whether intake is open, e.g. {% if capacity.meals.is_open %}
+# Templates only read the cache when they actually check a capacity
+def capacity(request):
+    return {"capacity": get_capacities()}
@@ -0,0 +1,47 @@
+"""
+Postgres database backend with health checked persistent connections
+
+With CONN_MAX_AGE set, each worker thread keeps its connection open between requests instead of
+paying for a new TCP connection, TLS handshake and authentication on every request. Because gunicorn
+workers serve one request per thread, this is effectively a pool of one connection per thread.
+
+A persistent connection can be dropped underneath us (Heroku Postgres maintenance, idle timeouts),
+so when CONN_HEALTH_CHECKS is set the connection is pinged the first time it is used in each request
+and silently replaced if it's gone. This mirrors the CONN_HEALTH_CHECKS setting added in Django 4.1.
+"""
+from django.db.backends.postgresql import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    health_check_done = False
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get("CONN_HEALTH_CHECKS", False)
+
+    def connect(self):
+        super().connect()
+        # A brand new connection doesn't need checking
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        # Called at the start and end of every request, so the next use gets checked again
+        if self.connection is not None:
+            self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def close_if_health_check_failed(self):
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+            or self.in_atomic_block
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
@@ -0,0 +1,164 @@
+"""
+Streaming exports of reporting queries
+
+Exports of meal and grocery request history can be far larger than we'd want to hold in memory,
+so rows are read from the database in chunks and written to the response as they arrive.
+On Postgres this uses a server-side cursor, so not even the database driver buffers the full result.
+
+Queries are checked before they run, but the check is only there to give a helpful error.
+What actually stops an export from writing is that it runs in a read-only transaction.
+"""
+import csv
+import hashlib
+import itertools
+import json
+from contextlib import contextmanager
+
+import sqlparse
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import NotSupportedError, connections, transaction
+from django.http import StreamingHttpResponse
+from sqlparse import tokens
+
+
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+}
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def validate_query(sql):
+    """Only allow a single read-only statement to be exported"""
+    statements = [
+        statement for statement in sqlparse.parse(sql) if str(statement).strip()
+    ]
+    if len(statements) != 1 or statements[0].get_type() != "SELECT":
+        raise InvalidQuery("Only a single SELECT statement can be exported")
+    # A SELECT can still write, through a data-modifying CTE, SELECT INTO or a locking clause (FOR UPDATE)
+    for token in statements[0].flatten():
+        if (
+            (token.ttype in tokens.DML and token.normalized != "SELECT")
+            or token.ttype in tokens.DDL
+            or (token.is_keyword and token.normalized in ("INTO", "FOR", "LOCK"))
+        ):
+            raise InvalidQuery(f"{token.normalized} isn't allowed in an export")
+
+
+@contextmanager
+def read_only(connection):
+    """Run the enclosed queries in a transaction that the database won't let write"""
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # Can only make the transaction more restrictive, so a query can't undo it
+                cursor.execute("SET TRANSACTION READ ONLY")
+            elif connection.vendor == "sqlite":
+                cursor.execute("PRAGMA query_only = ON")
+            else:
+                raise NotSupportedError(
+                    f"Read-only exports aren't supported on {connection.vendor}"
+                )
+        try:
+            yield
+        finally:
+            if connection.vendor == "sqlite":
+                with connection.cursor() as cursor:
+                    cursor.execute("PRAGMA query_only = OFF")
+
+
+def iter_query(sql, params=None, using=None, chunk_size=CHUNK_SIZE):
+    """Yield the column names, and then each row of the query results, reading chunk_size rows at a time"""
+    connection = connections[using or settings.EXPLORER_DEFAULT_CONNECTION]
+    # chunked_cursor is a named (server-side) cursor on Postgres, and a regular cursor elsewhere
+    with read_only(connection), connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchmany(chunk_size)
+        # Server-side cursors only describe their columns once the first rows are fetched
+        yield [column[0] for column in cursor.description]
+        while rows:
+            yield from rows
+            rows = cursor.fetchmany(chunk_size)
+
+
+def cache_key(sql, params=None, using=None):
+    query = json.dumps([using, sql, params], cls=DjangoJSONEncoder)
+    return "export:" + hashlib.sha256(query.encode()).hexdigest()
+
+
+def iter_cached_query(sql, params=None, using=None, timeout=None):
+    """
+    Like iter_query, but results are cached for `timeout` seconds
+
+    Small results (dashboards that staff re-open all day) are cached as they stream.
+    Results larger than EXPORT_CACHE_MAX_ROWS are never cached, so memory use stays bounded.
+    """
+    key = cache_key(sql, params, using)
+    cached = cache.get(key)
+    if cached is not None:
+        yield from cached
+        return
+
+    collected = []
+    for row in iter_query(sql, params, using):
+        if collected is not None:
+            collected.append(row)
+            if len(collected) > settings.EXPORT_CACHE_MAX_ROWS:
+                collected = None
+        yield row
+    if collected is not None:
+        cache.set(key, collected, timeout)
+
+
+class Echo:
+    """A file-like object that hands back whatever is written to it, for streaming csv.writer output"""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_json(rows):
+    rows = iter(rows)
+    columns = next(rows)
+    yield "["
+    for index, row in enumerate(rows):
+        yield ("," if index else "") + json.dumps(
+            dict(zip(columns, row)), cls=DjangoJSONEncoder
+        )
+    yield "]"
+
+
+RENDERERS = {
+    "csv": render_csv,
+    "json": render_json,
+}
+
+
+def export_response(sql, format="csv", filename="export", using=None, timeout=None):
+    """Stream the results of `sql` as a CSV or JSON download"""
+    validate_query(sql)
+    if timeout:
+        rows = iter_cached_query(sql, using=using, timeout=timeout)
+    else:
+        rows = iter_query(sql, using=using)
+    # Run the query before responding, so a query that fails (a misspelt column, say) raises DatabaseError
+    # here rather than after a 200 has been sent
+    columns = next(rows)
+    response = StreamingHttpResponse(
+        RENDERERS[format](itertools.chain([columns], rows)),
+        content_type=CONTENT_TYPES[format],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{format}"'
+    return response
@@ -0,0 +1,66 @@
+import statistics
+from time import perf_counter
+
+import dj_database_url
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-request database latency with and without persistent connections. "
+        "Use --url to measure connection setup cost against a Postgres server"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            "--url",
+            help="Benchmark this database (e.g. postgres://localhost/postgres) instead of --database",
+        )
+
+    def handle(self, *args, **options):
+        alias = options["database"]
+        if options["url"]:
+            alias = "benchmark"
+            connections.databases[alias] = dj_database_url.parse(options["url"])
+            if connections.databases[alias]["ENGINE"].startswith(
+                "django.db.backends.postgresql"
+            ):
+                # The backend we use in production
+                connections.databases[alias]["ENGINE"] = "core.db.postgresql"
+        connection = connections[alias]
+        original_max_age = connection.settings_dict["CONN_MAX_AGE"]
+        try:
+            fresh = self.time_requests(connection, options["requests"], max_age=0)
+            persistent = self.time_requests(
+                connection, options["requests"], max_age=600
+            )
+        finally:
+            connection.close()
+            connection.settings_dict["CONN_MAX_AGE"] = original_max_age
+
+        self.stdout.write(f"{connection.vendor} ({options['requests']} requests)")
+        for label, timings in (("New connection", fresh), ("Persistent", persistent)):
+            self.stdout.write(
+                f"{label:>16}: "
+                f"median {statistics.median(timings) * 1000:.3f}ms, "
+                f"mean {statistics.mean(timings) * 1000:.3f}ms"
+            )
+
+    def time_requests(self, connection, count, max_age):
+        connection.close()
+        connection.settings_dict["CONN_MAX_AGE"] = max_age
+        timings = []
+        for _ in range(count):
+            # The request signals are what close (or keep) connections between real requests
+            start = perf_counter()
+            request_started.send(sender=self.__class__)
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            request_finished.send(sender=self.__class__)
+            timings.append(perf_counter() - start)
+        return timings
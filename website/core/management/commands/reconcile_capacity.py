@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.capacity import get_capacities
+
+
+class Command(BaseCommand):
+    help = "Reset the intake capacity counters from the database"
+
+    def handle(self, *args, **options):
+        for name, capacity in get_capacities().items():
+            count = capacity.reconcile()
+            if count is None:
+                self.stdout.write(f"{name}: no source configured, skipping")
+            else:
+                self.stdout.write(f"{name}: {count} of {capacity.limit}")
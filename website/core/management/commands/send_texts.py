@@ -0,0 +1,138 @@
+import asyncio
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import TextMessage
+from core.textline import TextlineClient, TextResult
+
+
+class Command(BaseCommand):
+    help = "Send a text message to many phone numbers at once through Textline"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "numbers",
+            help="File containing one phone number per line, or - to read from stdin",
+        )
+        parser.add_argument("--message", required=True, help="The message to send")
+        parser.add_argument(
+            "--batch",
+            help="Name for this broadcast. Re-running a batch skips numbers that were already sent to",
+        )
+        parser.add_argument("--rate", type=float, default=settings.TEXTLINE_RATE_LIMIT)
+        parser.add_argument(
+            "--concurrency", type=int, default=settings.TEXTLINE_CONCURRENCY
+        )
+
+    def read_numbers(self, path):
+        stream = sys.stdin if path == "-" else open(path)
+        with stream:
+            numbers = [line.strip() for line in stream]
+        # Preserve the file's order, but never text the same number twice
+        return list(dict.fromkeys(number for number in numbers if number))
+
+    def handle(self, *args, **options):
+        if not settings.TEXTLINE_ACCESS_TOKEN:
+            raise CommandError("TEXTLINE_ACCESS_TOKEN is not configured")
+        if options["rate"] <= 0:
+            raise CommandError("--rate must be greater than 0")
+
+        batch = options["batch"] or timezone.now().strftime("broadcast-%Y%m%d-%H%M%S")
+        already_sent = set(
+            TextMessage.objects.filter(
+                batch=batch, status=TextMessage.Status.SENT
+            ).values_list("phone_number", flat=True)
+        )
+        numbers = [
+            number
+            for number in self.read_numbers(options["numbers"])
+            if number not in already_sent
+        ]
+        if already_sent:
+            self.stdout.write(
+                f"Skipping {len(already_sent)} numbers already sent to in {batch}"
+            )
+
+        client = TextlineClient(
+            settings.TEXTLINE_ACCESS_TOKEN,
+            base_url=settings.TEXTLINE_API_URL,
+            concurrency=options["concurrency"],
+            rate=options["rate"],
+        )
+        message = options["message"]
+        sent = failed = 0
+
+        # The ORM can't be used while an event loop is running in this thread, so we run the loop
+        # until at least one message finishes, record what finished, and repeat.
+        # Each message is logged as soon as it's sent, so if the command is killed, re-running
+        # the batch only repeats the messages that were in flight at the time.
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(client.__aenter__())
+            numbers_by_task = {
+                loop.create_task(client.send(number, message)): number
+                for number in numbers
+            }
+            pending = set(numbers_by_task)
+            try:
+                while pending:
+                    done, pending = loop.run_until_complete(
+                        asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    )
+                    results = [
+                        self.result(task, numbers_by_task[task], message)
+                        for task in done
+                    ]
+                    self.record(batch, results)
+                    for result in results:
+                        if result.ok:
+                            sent += 1
+                        else:
+                            failed += 1
+                            self.stderr.write(
+                                f"Failed to send to {result.phone_number}: {result.error}"
+                            )
+            finally:
+                # Only left over if we're stopping early
+                if pending:
+                    for task in pending:
+                        task.cancel()
+                    loop.run_until_complete(
+                        asyncio.gather(*pending, return_exceptions=True)
+                    )
+                loop.run_until_complete(client.__aexit__(None, None, None))
+        finally:
+            loop.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Sent {sent} messages ({failed} failed) in {batch}")
+        )
+
+    def result(self, task, phone_number, body):
+        # send() returns failures rather than raising, but if a bug makes it raise,
+        # the other messages that finished alongside it must still be logged
+        try:
+            return task.result()
+        except Exception as e:
+            return TextResult(
+                phone_number, body, False, 0, error=f"{type(e).__name__}: {e}"
+            )
+
+    def record(self, batch, results):
+        TextMessage.objects.bulk_create(
+            TextMessage(
+                batch=batch,
+                phone_number=result.phone_number,
+                body=result.body,
+                status=TextMessage.Status.SENT
+                if result.ok
+                else TextMessage.Status.FAILED,
+                attempts=result.attempts,
+                status_code=result.status_code,
+                error=result.error,
+            )
+            for result in results
+        )
@@ -0,0 +1,80 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = "Reset group permissions to match settings.GROUP_PERMISSIONS"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the changes that would be made without saving them",
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        # Runs on every deploy, so rather than clearing and re-adding every permission
+        # we load the current state in a fixed number of queries and only apply the difference
+        GroupPermission = Group.permissions.through
+        group_permissions = settings.GROUP_PERMISSIONS
+
+        groups = self.get_or_create_groups(group_permissions.keys())
+
+        permission_ids = defaultdict(set)
+        codenames = {
+            codename
+            for codenames in group_permissions.values()
+            for codename in codenames
+        }
+        for codename, permission_id in Permission.objects.filter(
+            codename__in=codenames
+        ).values_list("codename", "id"):
+            permission_ids[codename].add(permission_id)
+        for codename in sorted(codenames - permission_ids.keys()):
+            self.stderr.write(self.style.WARNING(f"Unknown permission: {codename}"))
+
+        wanted = {
+            (groups[name].id, permission_id)
+            for name, codenames in group_permissions.items()
+            for codename in codenames
+            for permission_id in permission_ids[codename]
+        }
+        existing = {
+            (group_id, permission_id): row_id
+            for row_id, group_id, permission_id in GroupPermission.objects.filter(
+                group__in=groups.values()
+            ).values_list("id", "group_id", "permission_id")
+        }
+        to_add = wanted - existing.keys()
+        to_remove = [existing[key] for key in existing.keys() - wanted]
+
+        GroupPermission.objects.filter(id__in=to_remove).delete()
+        GroupPermission.objects.bulk_create(
+            GroupPermission(group_id=group_id, permission_id=permission_id)
+            for group_id, permission_id in to_add
+        )
+        if options["dry_run"]:
+            transaction.set_rollback(True)
+
+        prefix = "Dry run: " if options["dry_run"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}Added {len(to_add)} and removed {len(to_remove)} group permissions"
+            )
+        )
+
+    def get_or_create_groups(self, names):
+        groups = {group.name: group for group in Group.objects.filter(name__in=names)}
+        missing = [Group(name=name) for name in names if name not in groups]
+        if missing:
+            # Not every database returns primary keys from bulk_create, so look them up again
+            Group.objects.bulk_create(missing)
+            groups = {
+                group.name: group for group in Group.objects.filter(name__in=names)
+            }
+        return groups
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import models
+
+
+class TextMessage(models.Model):
+    """Log of every text message we've attempted to send through Textline"""
+
+    class Status(models.TextChoices):
+        SENT = "sent", "Sent"
+        FAILED = "failed", "Failed"
+
+    # Messages sent together (e.g. a delivery-day broadcast) share a batch
+    # This lets an interrupted broadcast be re-run without texting anyone twice
+    batch = models.CharField(max_length=settings.NAME_LENGTH, db_index=True)
+    phone_number = models.CharField(max_length=settings.PHONE_NUMBER_LENGTH)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=Status.choices)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.phone_number} ({self.get_status_display()})"
+
+
+class CapacityCounter(models.Model):
+    """How much intake (e.g. meal requests) was submitted on a day, see core/capacity.py"""
+
+    name = models.CharField(max_length=settings.NAME_LENGTH)
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "day"], name="unique_capacity_counter"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.name} on {self.day}: {self.count}"
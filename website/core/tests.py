@@ -1,3 +1,540 @@
-# from django.test import TestCase
+import asyncio
+import datetime
+import json
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import httpx
+
+from django.contrib.auth.models import Group, Permission, User
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.core.checks import Tags, run_checks
+from django.db import DatabaseError, connections
+from django.http import StreamingHttpResponse
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .capacity import Capacity
+from .context_processors import capacity as capacity_context
+from .db.postgresql.base import DatabaseWrapper
+from .management.commands.send_texts import Command as SendTextsCommand
+from .exports import InvalidQuery, iter_cached_query, iter_query, validate_query
+from .models import CapacityCounter, TextMessage
+from .testing import LocalServer, QuietHandler
+from .textline import TextlineClient, TokenBucket
+
+
+class FakeTextlineServer(LocalServer):
+    """A local stand-in for the Textline API, which replies with the queued status codes in order"""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.requests = []
+        server = self
+
+        class Handler(QuietHandler):
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                server.requests.append(
+                    {
+                        "path": self.path,
+                        "headers": dict(self.headers),
+                        "json": json.loads(self.rfile.read(length)),
+                    }
+                )
+                status = server.statuses.pop(0) if server.statuses else 200
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+        super().__init__(Handler)
+        self.url += "api/"
+
+
+def send_many(url, messages, **kwargs):
+    async def send():
+        async with TextlineClient("token", base_url=url, **kwargs) as client:
+            return await client.send_many(messages)
+
+    return asyncio.run(send())
+
+
+class TextlineClientTests(SimpleTestCase):
+    def test_sends_messages(self):
+        with FakeTextlineServer() as server:
+            results = send_many(
+                server.url, [("4165550001", "Hi"), ("4165550002", "Hi")]
+            )
+
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(
+            [result.phone_number for result in results], ["4165550001", "4165550002"]
+        )
+        request = server.requests[0]
+        self.assertEqual(request["path"], "/api/conversations.json")
+        self.assertEqual(request["headers"]["X-TGP-ACCESS-TOKEN"], "token")
+        self.assertEqual(request["json"]["comment"], {"body": "Hi"})
+
+    def test_retries_rate_limited_and_server_errors(self):
+        with FakeTextlineServer([429, 503]) as server:
+            [result] = send_many(server.url, [("4165550001", "Hi")], backoff=0)
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.attempts, 3)
+        self.assertEqual(len(server.requests), 3)
+
+    def test_does_not_retry_client_errors(self):
+        with FakeTextlineServer([422]) as server:
+            [result] = send_many(server.url, [("bad", "Hi")], backoff=0)
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.status_code, 422)
+        self.assertEqual(len(server.requests), 1)
+
+    def test_gives_up_after_max_retries(self):
+        with FakeTextlineServer([500] * 10) as server:
+            [result] = send_many(
+                server.url, [("4165550001", "Hi")], backoff=0, max_retries=2
+            )
+
+        self.assertFalse(result.ok)
+        self.assertEqual(result.attempts, 3)
+
+    def test_returns_other_request_errors(self):
+        error = httpx.DecodingError("Malformed gzip")
+        with mock.patch("httpx.AsyncClient.post", side_effect=error) as mock_post:
+            [result] = send_many("http://127.0.0.1/", [("4165550001", "Hi")])
+
+        self.assertFalse(result.ok)
+        self.assertIn("DecodingError", result.error)
+        self.assertEqual(mock_post.call_count, 1)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_limits_rate_after_burst(self):
+        now = [0.0]
+
+        async def fake_sleep(delay):
+            now[0] += delay
+
+        async def acquire_many(count):
+            bucket = TokenBucket(rate=2, clock=lambda: now[0])
+            for _ in range(count):
+                await bucket.acquire()
+
+        with mock.patch("core.textline.asyncio.sleep", fake_sleep):
+            asyncio.run(acquire_many(6))
+
+        # A burst of 2 is free, then the remaining 4 are spaced half a second apart
+        self.assertAlmostEqual(now[0], 2.0)
+
+    def test_fractional_rate(self):
+        now = [0.0]
+
+        async def fake_sleep(delay):
+            now[0] += delay
+
+        async def acquire_many(count):
+            bucket = TokenBucket(rate=0.5, clock=lambda: now[0])
+            for _ in range(count):
+                await bucket.acquire()
+
+        with mock.patch("core.textline.asyncio.sleep", fake_sleep):
+            asyncio.run(acquire_many(3))
+
+        # The first is free, then one every two seconds
+        self.assertAlmostEqual(now[0], 4.0)
+
+    def test_rejects_zero_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+
+class SendTextsCommandTests(TestCase):
+    def send_texts(self, url, numbers, **options):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt") as numbers_file:
+            numbers_file.write("\n".join(numbers))
+            numbers_file.flush()
+            with override_settings(TEXTLINE_ACCESS_TOKEN="token", TEXTLINE_API_URL=url):
+                call_command(
+                    "send_texts",
+                    numbers_file.name,
+                    message="Deliveries are on their way!",
+                    stdout=StringIO(),
+                    stderr=StringIO(),
+                    **options,
+                )
+
+    def test_logs_every_message(self):
+        with FakeTextlineServer([422]) as server:
+            self.send_texts(
+                server.url,
+                ["4165550001", "4165550002", "4165550002"],
+                batch="delivery-day",
+                concurrency=1,
+            )
+
+        self.assertEqual(len(server.requests), 2)
+        self.assertEqual(
+            dict(TextMessage.objects.values_list("phone_number", "status")),
+            {"4165550001": "failed", "4165550002": "sent"},
+        )
+
+    def test_logs_each_message_as_it_completes(self):
+        record = SendTextsCommand.record
+        with FakeTextlineServer() as server:
+            with mock.patch.object(
+                SendTextsCommand, "record", autospec=True, side_effect=record
+            ) as mock_record:
+                self.send_texts(
+                    server.url,
+                    ["4165550001", "4165550002", "4165550003"],
+                    concurrency=1,
+                )
+
+        # One at a time, so each message is written as soon as it's sent
+        self.assertEqual(
+            [len(call.args[2]) for call in mock_record.call_args_list], [1, 1, 1]
+        )
+        self.assertEqual(TextMessage.objects.count(), 3)
+
+    def test_logs_messages_finished_alongside_an_error(self):
+        send = TextlineClient.send
+
+        async def fake_send(client, phone_number, body):
+            if phone_number == "4165550002":
+                raise RuntimeError("Unexpected")
+            return await send(client, phone_number, body)
+
+        with FakeTextlineServer() as server:
+            with mock.patch.object(TextlineClient, "send", fake_send):
+                self.send_texts(server.url, ["4165550001", "4165550002", "4165550003"])
+
+        self.assertEqual(
+            dict(TextMessage.objects.values_list("phone_number", "status")),
+            {"4165550001": "sent", "4165550002": "failed", "4165550003": "sent"},
+        )
+
+    def test_rejects_zero_rate(self):
+        with self.assertRaises(CommandError):
+            self.send_texts("http://127.0.0.1/", ["4165550001"], rate=0)
+
+    def test_rerunning_a_batch_skips_sent_numbers(self):
+        TextMessage.objects.create(
+            batch="delivery-day",
+            phone_number="4165550001",
+            body="Deliveries are on their way!",
+            status=TextMessage.Status.SENT,
+        )
+        with FakeTextlineServer() as server:
+            self.send_texts(
+                server.url, ["4165550001", "4165550002"], batch="delivery-day"
+            )
+
+        self.assertEqual(
+            [request["json"]["phone_number"] for request in server.requests],
+            ["4165550002"],
+        )
+
+
+@override_settings(
+    GROUP_PERMISSIONS={
+        "Chefs": ["view_group"],
+        "Organizers": ["view_group", "add_user", "view_user", "view_nonexistent"],
+    }
+)
+class SyncGroupPermissionsCommandTests(TestCase):
+    def sync(self, **options):
+        call_command(
+            "sync_group_permissions", stdout=StringIO(), stderr=StringIO(), **options
+        )
+
+    def codenames(self, name):
+        return set(
+            Group.objects.get(name=name).permissions.values_list("codename", flat=True)
+        )
+
+    def test_creates_groups_and_permissions(self):
+        self.sync()
+        self.assertEqual(self.codenames("Chefs"), {"view_group"})
+        self.assertEqual(
+            self.codenames("Organizers"), {"view_group", "add_user", "view_user"}
+        )
+
+    def test_only_applies_the_difference(self):
+        organizers = Group.objects.create(name="Organizers")
+        organizers.permissions.add(
+            Permission.objects.get(codename="view_user"),
+            Permission.objects.get(codename="delete_user"),
+        )
+        kept = organizers.permissions.through.objects.get(
+            permission__codename="view_user"
+        )
+        self.sync()
+
+        self.assertEqual(
+            self.codenames("Organizers"), {"view_group", "add_user", "view_user"}
+        )
+        self.assertTrue(
+            organizers.permissions.through.objects.filter(id=kept.id).exists()
+        )
+
+    def test_query_count_does_not_grow_with_permissions(self):
+        self.sync()
+        # Groups, permissions, existing group permissions, plus the savepoint
+        with self.assertNumQueries(5):
+            self.sync()
+
+    def test_dry_run(self):
+        self.sync(dry_run=True)
+        self.assertFalse(Group.objects.exists())
+
+
+class PermissionCacheTests(TestCase):
+    def test_repeated_permission_checks_are_cached(self):
+        # Organizer views check permissions many times while rendering a single request
+        # ModelBackend caches them on the user for the lifetime of that request
+        group = Group.objects.create(name="Organizers")
+        group.permissions.add(Permission.objects.get(codename="view_user"))
+        user = User.objects.create_user("organizer")
+        user.groups.add(group)
+
+        self.client.force_login(user)
+        user = self.client.get("/").wsgi_request.user
+        self.assertTrue(user.is_authenticated)
+        # User permissions, then group permissions
+        with self.assertNumQueries(2):
+            self.assertTrue(user.has_perm("auth.view_user"))
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perm("auth.view_user"))
+            self.assertFalse(user.has_perm("auth.add_user"))
+            self.assertTrue(user.has_perms(["auth.view_user"]))
+
+
+class ExportTests(TestCase):
+    sql = "SELECT username, length(username) AS length FROM auth_user ORDER BY username"
+
+    @classmethod
+    def setUpTestData(cls):
+        for username in ("alex", "blake", "casey"):
+            User.objects.create_user(username)
+        cls.superuser = User.objects.create_superuser("admin")
+
+    def setUp(self):
+        cache.clear()
+
+    def export(self, **params):
+        self.client.force_login(self.superuser)
+        return self.client.post(reverse("core:export"), {"sql": self.sql, **params})
+
+    def test_reads_in_chunks(self):
+        rows = list(iter_query(self.sql, chunk_size=2))
+        self.assertEqual(rows[0], ["username", "length"])
+        self.assertEqual(
+            [row[0] for row in rows[1:]], ["admin", "alex", "blake", "casey"]
+        )
+
+    def test_only_allows_a_single_select(self):
+        validate_query("WITH staff AS (SELECT * FROM auth_user) SELECT * FROM staff")
+        for sql in (
+            "DELETE FROM auth_user",
+            "SELECT 1; DROP TABLE auth_user",
+            "",
+            "WITH d AS (DELETE FROM auth_user RETURNING 1) SELECT * FROM d",
+            "SELECT * INTO evil FROM auth_user",
+            "SELECT * FROM auth_user FOR UPDATE",
+        ):
+            with self.subTest(sql), self.assertRaises(InvalidQuery):
+                validate_query(sql)
+
+    def test_runs_read_only(self):
+        # Even if a write gets past validate_query, the database refuses it
+        with self.assertRaises(DatabaseError):
+            list(iter_query("UPDATE auth_user SET username = 'x' RETURNING username"))
+        self.assertFalse(User.objects.filter(username="x").exists())
+        # And the connection is writable again afterwards
+        User.objects.create_user("dana")
+
+    def test_streams_csv(self):
+        response = self.export()
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(
+            b"".join(response.streaming_content).decode().splitlines(),
+            ["username,length", "admin,5", "alex,4", "blake,5", "casey,5"],
+        )
+
+    def test_streams_json(self):
+        response = self.export(format="json")
+        rows = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(rows[0], {"username": "admin", "length": 5})
+        self.assertEqual(len(rows), 4)
+
+    def test_rejects_invalid_requests(self):
+        self.assertEqual(self.export(format="xml").status_code, 400)
+        self.assertEqual(self.export(sql="DELETE FROM auth_user").status_code, 400)
+
+    def test_rejects_failing_queries_before_streaming(self):
+        response = self.export(sql="SELECT nope FROM auth_user")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"nope", response.content)
+
+    def test_requires_permission(self):
+        self.client.force_login(User.objects.get(username="alex"))
+        response = self.client.post(reverse("core:export"), {"sql": self.sql})
+        self.assertEqual(response.status_code, 403)
+
+    def test_requires_csrf_protected_post(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.superuser)
+        url = reverse("core:export")
+        self.assertEqual(client.get(url, {"sql": self.sql}).status_code, 405)
+        self.assertEqual(client.post(url, {"sql": self.sql}).status_code, 403)
+
+    def test_caches_small_results(self):
+        rows = list(iter_cached_query(self.sql, timeout=60))
+        with self.assertNumQueries(0):
+            self.assertEqual(list(iter_cached_query(self.sql, timeout=60)), rows)
+
+    @override_settings(EXPORT_CACHE_MAX_ROWS=2)
+    def test_does_not_cache_large_results(self):
+        list(iter_cached_query(self.sql, timeout=60))
+        with CaptureQueriesContext(connections["default"]) as queries:
+            list(iter_cached_query(self.sql, timeout=60))
+        self.assertIn(self.sql, [query["sql"] for query in queries])
+
+
+class HealthCheckTests(SimpleTestCase):
+    def connection(self, enabled=True):
+        settings_dict = {
+            **connections["default"].settings_dict,
+            "ENGINE": "core.db.postgresql",
+            "CONN_HEALTH_CHECKS": enabled,
+        }
+        wrapper = DatabaseWrapper(settings_dict)
+        wrapper.connection = mock.Mock()
+        wrapper.autocommit = True
+        return wrapper
+
+    def test_replaces_dead_connection_once_per_request(self):
+        wrapper = self.connection()
+        with mock.patch.object(wrapper, "is_usable", return_value=False) as is_usable:
+            wrapper.close_if_health_check_failed()
+            self.assertIsNone(wrapper.connection)
+            wrapper.close_if_health_check_failed()
+        is_usable.assert_called_once()
+
+    def test_checks_again_on_next_request(self):
+        wrapper = self.connection()
+        with mock.patch.object(wrapper, "is_usable", return_value=True) as is_usable:
+            wrapper.close_if_health_check_failed()
+            wrapper.close_if_health_check_failed()
+            wrapper.close_if_unusable_or_obsolete()
+            wrapper.close_if_health_check_failed()
+        self.assertEqual(is_usable.call_count, 2)
+        self.assertIsNotNone(wrapper.connection)
+
+    def test_disabled(self):
+        wrapper = self.connection(enabled=False)
+        with mock.patch.object(wrapper, "is_usable") as is_usable:
+            wrapper.close_if_health_check_failed()
+        is_usable.assert_not_called()
+
+
+def fake_meal_counts(start, end):
+    return {start: 10, end: 20, end - datetime.timedelta(days=30): 1000}
+
+
+class CapacityTests(TestCase):
+    today = datetime.date(2021, 5, 3)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_submissions_in_period(self):
+        meals = Capacity("meals", limit=3)
+        meals.record(today=self.today)
+        meals.record(today=self.today - datetime.timedelta(days=6))
+        self.assertEqual(meals.count(today=self.today), 2)
+        self.assertEqual(meals.remaining(today=self.today), 1)
+        self.assertTrue(meals.is_open(today=self.today))
+
+        meals.record(today=self.today)
+        self.assertEqual(meals.remaining(today=self.today), 0)
+        self.assertFalse(meals.is_open(today=self.today))
+
+    def test_reopens_as_submissions_leave_the_period(self):
+        groceries = Capacity("groceries", limit=10)
+        groceries.record(10, today=self.today)
+        self.assertFalse(groceries.is_open(today=self.today))
+        self.assertTrue(
+            groceries.is_open(today=self.today + datetime.timedelta(days=7))
+        )
+
+    def test_disabled(self):
+        self.assertFalse(Capacity("meals", limit=3, disabled=True).is_open())
+
+    def test_checking_is_a_single_cache_read(self):
+        meals = Capacity("meals", limit=3)
+        meals.is_open()
+        with self.assertNumQueries(0), mock.patch.object(
+            cache, "get", wraps=cache.get
+        ) as get:
+            meals.is_open()
+        get.assert_called_once()
+
+    def test_counts_concurrent_submissions(self):
+        # Two workers that both read the counter before either writes it mustn't count as one submission
+        meals = Capacity("meals", limit=3)
+        meals.record(today=self.today)
+        counter = CapacityCounter.objects.get(name="meals")
+        with mock.patch.object(
+            CapacityCounter.objects, "get_or_create", return_value=(counter, False)
+        ):
+            meals.record(today=self.today)
+            meals.record(today=self.today)
+        self.assertEqual(meals.count(today=self.today), 3)
+
+    def test_reconcile(self):
+        meals = Capacity("meals", limit=45, source="core.tests.fake_meal_counts")
+        meals.record(5, today=self.today)
+        meals.record(5, today=self.today - datetime.timedelta(days=30))
+        self.assertEqual(meals.count(today=self.today), 5)
+        self.assertEqual(meals.reconcile(today=self.today), 30)
+        self.assertEqual(meals.count(today=self.today), 30)
+        # Counters from before the period are removed
+        self.assertEqual(CapacityCounter.objects.count(), 7)
+
+    def test_reconcile_without_source(self):
+        self.assertIsNone(Capacity("meals", limit=45).reconcile())
+
+    @override_settings(
+        INTAKE_CAPACITY={"meals": {"limit": 1, "source": "core.tests.fake_meal_counts"}}
+    )
+    def test_context_processor_and_command(self):
+        call_command("reconcile_capacity", stdout=StringIO())
+        capacity = capacity_context(None)["capacity"]
+        self.assertFalse(capacity["meals"].is_open())
+
+
+class CapacityCacheCheckTests(SimpleTestCase):
+    def errors(self):
+        # Through run_checks, so this fails if the check isn't registered when the app loads
+        with override_settings(SILENCED_SYSTEM_CHECKS=[]):
+            return [error.id for error in run_checks(tags=[Tags.caches])]
+
+    def test_requires_a_shared_cache(self):
+        self.assertEqual(self.errors(), ["core.E001"])
+
+        shared = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache"}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(self.errors(), [])
+        with override_settings(INTAKE_CAPACITY={}):
+            self.assertEqual(self.errors(), [])
@@ -0,0 +1,187 @@
+"""
+Asynchronous client for the Textline API
+https://textline.docs.apiary.io/
+
+Sending one blocking request per message is far too slow for delivery-day broadcasts,
+so this client sends many messages concurrently over a single pooled HTTP connection.
+It stays within the provider's limits using a token bucket, and retries transient
+failures (timeouts, 429s and 5xx responses) with exponential backoff.
+
+The client is deliberately free of any Django ORM access so that it can run inside an
+event loop. Callers are responsible for recording the results (see the send_texts command).
+"""
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+
+API_URL = "https://application.textline.com/api/"
+ACCESS_TOKEN_HEADER = "X-TGP-ACCESS-TOKEN"
+
+# Textline doesn't publish a hard limit, so we stay well below what they've told us is acceptable
+DEFAULT_RATE = 5  # Messages per second
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # Seconds, doubled on every retry
+DEFAULT_TIMEOUT = 10  # Seconds
+
+# Responses with these status codes are worth trying again, anything else is a permanent failure
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Rate limiter allowing `rate` acquisitions per second, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError("rate must be greater than 0")
+        self.rate = rate
+        # A bucket that can't hold a whole token would never let anything through
+        self.capacity = max(capacity or rate, 1)
+        self.clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        if now > self._updated:
+            elapsed = now - self._updated
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+        return now
+
+    async def acquire(self):
+        # The lock makes waiters queue up in order, rather than all waking at once
+        async with self._lock:
+            while True:
+                now = self._refill()
+                if now >= self._updated and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = max(self._updated - now, 0) + (1 - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        """Empty the bucket and stop refilling it for `seconds`, e.g. when the provider asks us to back off."""
+        self._refill()
+        self._tokens = 0
+        self._updated = max(self._updated, self.clock() + seconds)
+
+
+@dataclass
+class TextResult:
+    phone_number: str
+    body: str
+    ok: bool
+    attempts: int
+    status_code: Optional[int] = None
+    error: str = ""
+
+
+class TextlineClient:
+    """
+    Send text messages through Textline concurrently
+
+    Use as an async context manager so the underlying connection pool is opened and closed:
+
+        async with TextlineClient(settings.TEXTLINE_ACCESS_TOKEN) as client:
+            results = await client.send_many([("+14165551234", "Hello!")])
+    """
+
+    def __init__(
+        self,
+        access_token,
+        base_url=API_URL,
+        concurrency=DEFAULT_CONCURRENCY,
+        rate=DEFAULT_RATE,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff=DEFAULT_BACKOFF,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        self.access_token = access_token
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.rate = rate
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._client = None
+
+    async def __aenter__(self):
+        # asyncio primitives must be created inside the running event loop
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._bucket = TokenBucket(self.rate)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={ACCESS_TOKEN_HEADER: self.access_token},
+            limits=httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency,
+            ),
+            timeout=self.timeout,
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._client.aclose()
+        self._client = None
+
+    def _backoff_delay(self, attempt, response=None):
+        # Respect the provider's Retry-After if they gave us one
+        if response is not None and "Retry-After" in response.headers:
+            try:
+                return float(response.headers["Retry-After"])
+            except ValueError:
+                pass
+        # Full jitter keeps concurrent retries from stampeding at the same moment
+        return random.uniform(0, self.backoff * 2 ** (attempt - 1))
+
+    async def send(self, phone_number, body):
+        """Send a single message, retrying transient failures, and return a TextResult."""
+        payload = {"phone_number": phone_number, "comment": {"body": body}}
+        attempt = 0
+        async with self._semaphore:
+            while True:
+                attempt += 1
+                await self._bucket.acquire()
+                response = None
+                try:
+                    response = await self._client.post(
+                        "conversations.json", json=payload
+                    )
+                except httpx.TransportError as e:
+                    error = f"{type(e).__name__}: {e}"
+                except httpx.HTTPError as e:
+                    # Anything else (an undecodable response, too many redirects) won't be fixed by retrying
+                    error = f"{type(e).__name__}: {e}"
+                    break
+                else:
+                    if response.is_success:
+                        return TextResult(
+                            phone_number, body, True, attempt, response.status_code
+                        )
+                    error = response.text[:500]
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        break
+
+                if attempt > self.max_retries:
+                    break
+                delay = self._backoff_delay(attempt, response)
+                if response is not None and response.status_code == 429:
+                    # Being rate limited applies to every in-flight message, not just this one
+                    self._bucket.pause(delay)
+                await asyncio.sleep(delay)
+
+        status_code = response.status_code if response is not None else None
+        return TextResult(phone_number, body, False, attempt, status_code, error)
+
+    async def send_many(self, messages):
+        """Send (phone_number, body) pairs concurrently and return their TextResults in order."""
+        return await asyncio.gather(
+            *(self.send(phone_number, body) for phone_number, body in messages)
+        )
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import DatabaseError
+from django.http import HttpResponseBadRequest
+from django.views.decorators.http import require_POST
+
+from .exports import RENDERERS, InvalidQuery, export_response
+
+
+# POST only, so running a query is protected from CSRF (unlike a link or <img> to a GET url)
+@require_POST
+def export(request):
+    """Stream the results of a reporting query, POSTed as sql, format (csv or json) and ttl"""
+    # Writing SQL is limited to the same people who can write queries in SQL Explorer
+    if not settings.EXPLORER_PERMISSION_CHANGE(request):
+        raise PermissionDenied
+
+    sql = request.POST.get("sql", "")
+    format = request.POST.get("format", "csv")
+    if format not in RENDERERS:
+        return HttpResponseBadRequest(f"Unsupported format: {format}")
+    try:
+        timeout = int(request.POST.get("ttl", 0))
+    except ValueError:
+        return HttpResponseBadRequest("ttl must be a number of seconds")
+
+    try:
+        return export_response(sql, format, timeout=timeout)
+    except (InvalidQuery, DatabaseError) as e:
+        return HttpResponseBadRequest(str(e))
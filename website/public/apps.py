@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class PublicConfig(AppConfig):
     name = "public"
+
+    def ready(self):
+        from .search import refresh_index
+
+        # Build the search index up front, rather than on the first search
+        refresh_index()
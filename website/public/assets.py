@@ -0,0 +1,65 @@
+"""
+Static asset analysis of our templates
+
+Finds the files a template references with {% static %}, following {% extends %} and {% include %},
+so build steps can work from what the pages actually use rather than a hand-maintained list.
+"""
+from urllib.parse import unquote
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.template.loader import get_template
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.templatetags.static import StaticNode
+
+
+def literal(expression):
+    """The value of a template expression if it's a plain string literal, otherwise None"""
+    if not expression.filters and isinstance(expression.var, str):
+        return str(expression.var)
+    return None
+
+
+def walk(nodelist, seen):
+    for node in nodelist:
+        if isinstance(node, StaticNode):
+            path = literal(node.path)
+            if path:
+                yield path
+        elif isinstance(node, (ExtendsNode, IncludeNode)):
+            expression = (
+                node.parent_name if isinstance(node, ExtendsNode) else node.template
+            )
+            name = literal(expression)
+            if name and name not in seen:
+                seen.add(name)
+                yield from walk(get_template(name).template.nodelist, seen)
+        for attr in node.child_nodelists:
+            yield from walk(getattr(node, attr, None) or [], seen)
+
+
+def static_paths(template_name):
+    """Paths of the static files referenced by a template, in the order they appear"""
+    return list(
+        dict.fromkeys(walk(get_template(template_name).template.nodelist, set()))
+    )
+
+
+def template_names(template_name):
+    """Names of a template and every template it extends or includes"""
+    seen = {template_name}
+    for _ in walk(get_template(template_name).template.nodelist, seen):
+        pass
+    return sorted(seen)
+
+
+def static_urls(template_name):
+    """{path: url} for each static file referenced by a template, using the hashed names from the manifest"""
+    urls = {}
+    for path in static_paths(template_name):
+        try:
+            # Some templates reference paths with spaces already escaped (%20), the storage expects them unescaped
+            urls[path] = staticfiles_storage.url(unquote(path))
+        except ValueError:
+            # Referenced, but missing from the manifest. The page will 404 on it too, so don't prefetch it
+            continue
+    return urls
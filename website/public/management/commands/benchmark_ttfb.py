@@ -0,0 +1,40 @@
+import statistics
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from public.views import AboutView, IndexView
+
+
+class Command(BaseCommand):
+    help = "Compare time to first byte of streamed and buffered rendering for the long public pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        for view_class in (IndexView, AboutView):
+            self.stdout.write(view_class.template_name)
+            for label, stream in (("Buffered", False), ("Streaming", True)):
+                view = view_class.as_view(stream=stream)
+                first_byte, total = [], []
+                for _ in range(options["requests"]):
+                    start = perf_counter()
+                    response = view(factory.get("/"))
+                    if stream:
+                        chunks = iter(response.streaming_content)
+                        next(chunks)
+                        first_byte.append(perf_counter() - start)
+                        for _ in chunks:
+                            pass
+                    else:
+                        response.render()
+                        first_byte.append(perf_counter() - start)
+                    total.append(perf_counter() - start)
+                self.stdout.write(
+                    f"{label:>12}: "
+                    f"first byte {statistics.median(first_byte) * 1000:.2f}ms, "
+                    f"complete {statistics.median(total) * 1000:.2f}ms"
+                )
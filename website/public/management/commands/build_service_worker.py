@@ -0,0 +1,56 @@
+import hashlib
+import json
+from os import getenv
+from urllib.parse import unquote
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from public.assets import static_urls
+from public.views import service_worker_path
+
+# Only precache the kinds of files every page needs, e.g. skip the social media preview image
+PRECACHE_EXTENSIONS = (".css", ".js", ".woff2", ".png", ".svg", ".ico", ".webmanifest")
+PAGES = ("public:index", "public:media", "public:about", "public:recipes")
+
+
+class Command(BaseCommand):
+    help = "Generate the service worker from the static files referenced by layout.html. Run after collectstatic"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            help="Where to write the service worker (defaults to STATIC_ROOT)",
+        )
+
+    def handle(self, *args, **options):
+        precache_urls = [
+            url
+            for path, url in static_urls("layout.html").items()
+            if unquote(path).endswith(PRECACHE_EXTENSIONS)
+        ]
+        precache_version = hashlib.sha1(json.dumps(precache_urls).encode()).hexdigest()
+        # Heroku sets SOURCE_VERSION to the commit being built, so each deploy gets fresh page caches
+        pages_version = getenv("SOURCE_VERSION") or timezone.now().strftime(
+            "%Y%m%d%H%M%S"
+        )
+
+        content = render_to_string(
+            "public/service_worker.js",
+            {
+                "precache_version": precache_version[:12],
+                "pages_version": pages_version[:12],
+                "precache_urls": json.dumps(precache_urls, indent=2),
+                "page_urls": json.dumps([reverse(page) for page in PAGES]),
+            },
+        )
+        output = options["output"] or service_worker_path()
+        with open(output, "w") as f:
+            f.write(content)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {output} precaching {len(precache_urls)} static files"
+            )
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import reverse
+from django.views.generic import TemplateView
+
+from public.minify import minify_html
+from public.urls import app_name, urlpatterns
+
+
+class Command(BaseCommand):
+    help = "Report the size of each public page before and after minification"
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        total_before = total_after = 0
+        for pattern in urlpatterns:
+            view_class = getattr(pattern.callback, "view_class", None)
+            if not pattern.name or not issubclass(view_class or object, TemplateView):
+                continue
+            url = reverse(f"{app_name}:{pattern.name}")
+            response = pattern.callback(factory.get(url))
+            if response.streaming:
+                html = b"".join(response.streaming_content)
+            else:
+                html = response.render().content
+            before = len(html)
+            after = len(minify_html(html.decode(response.charset)).encode())
+            total_before += before
+            total_after += after
+            self.stdout.write(self.row(url, before, after))
+        self.stdout.write(self.row("Total", total_before, total_after))
+
+    def row(self, label, before, after):
+        saved = 1 - after / before if before else 0
+        return f"{label:<10} {before:>8,} B -> {after:>8,} B ({saved:.1%} smaller)"
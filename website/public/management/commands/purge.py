@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from public.models import SurrogateKey
+from public.purge import PurgeError, get_backend
+from public.surrogate import fingerprints
+
+
+class Command(BaseCommand):
+    help = "Purge cached public pages whose content has changed since the last purge"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "keys",
+            nargs="*",
+            help="Purge these surrogate keys, rather than the ones that have changed",
+        )
+        parser.add_argument(
+            "--all", action="store_true", help="Purge every surrogate key"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the keys that would be purged without purging them",
+        )
+
+    def handle(self, *args, **options):
+        current = fingerprints()
+        purged = dict(SurrogateKey.objects.values_list("key", "fingerprint"))
+        if options["all"]:
+            keys = sorted(current.keys() | purged.keys())
+        elif options["keys"]:
+            keys = sorted(set(options["keys"]))
+        else:
+            # Keys that no longer exist are included, since pages might still be cached with them
+            keys = sorted(
+                key
+                for key in current.keys() | purged.keys()
+                if current.get(key) != purged.get(key)
+            )
+
+        if not keys:
+            self.stdout.write(self.style.SUCCESS("Nothing to purge"))
+            return
+        if options["dry_run"]:
+            self.stdout.write(f"Dry run: would purge {', '.join(keys)}")
+            return
+
+        try:
+            get_backend().purge(keys)
+        except PurgeError as e:
+            # The fingerprints aren't updated, so the next run will try these keys again
+            raise CommandError(e)
+
+        with transaction.atomic():
+            SurrogateKey.objects.filter(key__in=keys).delete()
+            SurrogateKey.objects.bulk_create(
+                SurrogateKey(key=key, fingerprint=current[key])
+                for key in keys
+                if key in current
+            )
+        self.stdout.write(self.style.SUCCESS(f"Purged {', '.join(keys)}"))
@@ -0,0 +1,130 @@
+import codecs
+from functools import lru_cache
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist
+
+from .assets import static_urls
+from .minify import minify_chunks, minify_html
+from .surrogate import response_keys
+
+# How the browser should fetch each kind of critical asset, the ones that block the first render
+# Scripts aren't included: ours load at the end of the body, and preloading them would make them
+# compete with the stylesheets and fonts for bandwidth
+# Only woff2 fonts are preloaded, since every browser that supports preload also supports woff2
+PRELOAD_TYPES = {
+    ".css": "as=style",
+    ".woff2": 'as=font; type="font/woff2"; crossorigin',
+}
+
+
+@lru_cache(maxsize=None)
+def preload_header(template_name):
+    links = []
+    for path, url in static_urls(template_name).items():
+        for extension, attributes in PRELOAD_TYPES.items():
+            if unquote(path).endswith(extension):
+                links.append(f"<{url}>; rel=preload; {attributes}")
+    return ", ".join(links)
+
+
+class PreloadMiddleware:
+    """
+    Add a Link header preloading the stylesheets and woff2 fonts a page's template references
+
+    Browsers (and CDNs, which can turn these headers into 103 Early Hints) can start fetching them
+    before the HTML has arrived and been parsed. The assets come from a scan of the view's template tree,
+    done once per template, so the header can't drift out of date with the templates.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        template_names = getattr(response, "template_name", None)
+        if (
+            request.method != "GET"
+            or response.status_code != 200
+            or not template_names
+            or "Link" in response
+            or not response.get("Content-Type", "").startswith("text/html")
+        ):
+            return response
+
+        if isinstance(template_names, str):
+            template_names = [template_names]
+        for template_name in template_names:
+            try:
+                header = preload_header(template_name)
+            except TemplateDoesNotExist:
+                continue
+            if header:
+                response["Link"] = header
+            break
+        return response
+
+
+class MinifyHTMLMiddleware:
+    """
+    Minify HTML responses, streamed or not
+
+    This should come after anything that encodes the body (like GZipMiddleware) in MIDDLEWARE,
+    so it sees the HTML before they do.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        content_type = response.get("Content-Type", "")
+        if not content_type.startswith("text/html") or "Content-Encoding" in response:
+            return response
+
+        charset = response.charset
+        if response.streaming:
+            # A character could be split between chunks, so decode incrementally
+            decoder = codecs.getincrementaldecoder(charset)()
+            response.streaming_content = (
+                chunk.encode(charset)
+                for chunk in minify_chunks(
+                    decoder.decode(chunk) for chunk in response.streaming_content
+                )
+            )
+        else:
+            response.content = minify_html(response.content.decode(charset))
+            if response.has_header("Content-Length"):
+                response["Content-Length"] = str(len(response.content))
+        return response
+
+
+class SurrogateKeyMiddleware:
+    """
+    Tag public pages with the surrogate keys of the content they were built from (see surrogate.py)
+
+    A caching proxy in front of the site can then keep them until `manage.py purge` says they've changed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        match = request.resolver_match
+        if (
+            request.method not in ("GET", "HEAD")
+            or response.status_code != 200
+            or match is None
+            or match.app_name != "public"
+            # Not for a shared cache, like AboutView's random photos
+            or "private" in response.get("Cache-Control", "")
+        ):
+            return response
+
+        view_class = getattr(match.func, "view_class", None)
+        response[settings.SURROGATE_KEY_HEADER] = " ".join(
+            response_keys(view_class, response)
+        )
+        return response
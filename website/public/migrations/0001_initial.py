@@ -0,0 +1,30 @@
+# Generated by Django 3.1.13 on 2026-10-19 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="SurrogateKey",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=256, unique=True)),
+                ("fingerprint", models.CharField(max_length=40)),
+                ("purged_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,116 @@
+"""
+HTML minification
+
+Our templates are full of indentation, blank lines and comments that every response would otherwise ship.
+Runs of whitespace are collapsed and comments removed, while quoted attribute values and the contents of
+<pre>, <script>, <style> and <textarea> are left exactly as they are since whitespace is significant there.
+
+Most pages render identically for every visitor, so results are memoized by a hash of their content.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+# Comments, the elements whose contents we must leave alone, and other tags (whose attribute values we must
+# leave alone, even if they contain a ">")
+TOKEN_RE = re.compile(
+    r"<!--.*?-->"
+    r"|<(pre|script|style|textarea)\b.*?</\1\s*>"
+    r"|(<(?!(?:pre|script|style|textarea)\b)[a-zA-Z/][^>\"']*(?:(?:\"[^\"]*\"|'[^']*')[^>\"']*)*>)",
+    re.DOTALL | re.IGNORECASE,
+)
+OPENING_RE = re.compile(r"<!--|<(?:pre|script|style|textarea)\b", re.IGNORECASE)
+WHITESPACE_RE = re.compile(r"\s+")
+QUOTED_OR_WHITESPACE_RE = re.compile(r"(\"[^\"]*\"|'[^']*')|\s+")
+
+CACHE_SIZE = 256
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def collapse_whitespace(text):
+    # Keep a newline where there was one, so the output still has some line structure to debug with
+    return WHITESPACE_RE.sub(lambda match: "\n" if "\n" in match.group() else " ", text)
+
+
+def collapse_tag(tag):
+    """Collapse the whitespace between a tag's attributes, but not inside their quoted values"""
+    return QUOTED_OR_WHITESPACE_RE.sub(
+        lambda match: match.group(1) or collapse_whitespace(match.group()), tag
+    )
+
+
+def minify(html):
+    output = []
+    position = 0
+    for match in TOKEN_RE.finditer(html):
+        start, end = match.span()
+        output.append(collapse_whitespace(html[position:start]))
+        token = match.group()
+        if match.group(2):
+            output.append(collapse_tag(token))
+        # Conditional comments are instructions to old browsers, not commentary
+        elif not token.startswith("<!--") or token.startswith("<!--[if"):
+            output.append(token)
+        position = end
+    output.append(collapse_whitespace(html[position:]))
+    return "".join(output)
+
+
+def split_unclosed(html):
+    """Split off a trailing comment or preserved element that hasn't been closed (yet)"""
+    end = 0
+    for match in TOKEN_RE.finditer(html):
+        end = match.end()
+    opening = OPENING_RE.search(html, end)
+    if opening is None:
+        return html, ""
+    start = opening.start()
+    return html[:start], html[start:]
+
+
+def minify_html(html):
+    """Minify html, reusing the result from the last time we saw the same content"""
+    html, unclosed = split_unclosed(html)
+    key = hashlib.blake2b(html.encode(), digest_size=16).digest()
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key] + unclosed
+
+    minified = minify(html)
+    with _cache_lock:
+        _cache[key] = minified
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    # Anything left unclosed is malformed, so it's safest to leave it untouched
+    return minified + unclosed
+
+
+def split_chunk(html):
+    complete, pending = split_unclosed(html)
+    if pending:
+        return complete, pending
+    # The last run of whitespace or a tag that's still open might continue in the next chunk
+    end = len(html.rstrip())
+    tag = html.rfind("<")
+    if tag > html.rfind(">"):
+        end = min(end, tag)
+    return html[:end], html[end:]
+
+
+def minify_chunks(chunks):
+    """
+    Minify a stream of html chunks
+
+    Anything that could continue into the next chunk, like a <script> element, is held back until
+    it's complete, so the result is the same as minifying the whole page at once.
+    """
+    pending = ""
+    for chunk in chunks:
+        complete, pending = split_chunk(pending + chunk)
+        if complete:
+            yield minify_html(complete)
+    if pending:
+        yield minify_html(pending)
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.db import models
+
+
+class SurrogateKey(models.Model):
+    """
+    The fingerprint of each surrogate key's content when it was last purged
+
+    `manage.py purge` compares these with the current fingerprints to tell which keys need purging.
+    """
+
+    key = models.CharField(max_length=settings.DEFAULT_LENGTH, unique=True)
+    fingerprint = models.CharField(max_length=40)
+    purged_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.key
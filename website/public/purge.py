@@ -0,0 +1,76 @@
+"""
+Purge backends for the caching proxy in front of the site
+
+PURGE_BACKEND in settings picks the backend, like CACHES does for caches:
+{"BACKEND": "dotted.path.to.Backend", "OPTIONS": {keyword arguments for the backend}}
+"""
+import httpx
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class PurgeError(Exception):
+    pass
+
+
+class PurgeBackend:
+    def __init__(self, **options):
+        pass
+
+    def purge(self, keys):
+        """Invalidate every cached response tagged with any of `keys`"""
+        raise NotImplementedError
+
+
+class DummyPurgeBackend(PurgeBackend):
+    """For when there's no proxy in front of the site, like in development"""
+
+    def purge(self, keys):
+        pass
+
+
+class HTTPPurgeBackend(PurgeBackend):
+    """
+    Purge by sending the proxy a request listing the keys in a header
+
+    This covers Varnish (with xkey), Fastly and most CDNs that support surrogate keys,
+    e.g. for Fastly: {"url": "https://api.fastly.com/service/<id>/purge", "method": "POST",
+    "headers": {"Fastly-Key": "<token>"}}
+    """
+
+    def __init__(
+        self,
+        url,
+        method="PURGE",
+        header="Surrogate-Key",
+        headers=None,
+        batch_size=256,
+        timeout=10,
+    ):
+        self.url = url
+        self.method = method
+        self.header = header
+        self.headers = headers or {}
+        # Proxies limit how many keys can be purged in one request (Fastly allows 256)
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+    def purge(self, keys):
+        keys = list(keys)
+        with httpx.Client(headers=self.headers, timeout=self.timeout) as client:
+            for start in range(0, len(keys), self.batch_size):
+                end = start + self.batch_size
+                try:
+                    response = client.request(
+                        self.method,
+                        self.url,
+                        headers={self.header: " ".join(keys[start:end])},
+                    )
+                    response.raise_for_status()
+                except httpx.HTTPError as e:
+                    raise PurgeError(f"Purging {keys[start:end]} failed: {e}") from e
+
+
+def get_backend():
+    config = settings.PURGE_BACKEND
+    return import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
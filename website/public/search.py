@@ -0,0 +1,225 @@
+"""
+In-memory search over the site's content
+
+The searchable content (media stories, testimonials and the cookbook page) lives in code, not the database,
+so we build an inverted index of it in memory when the app loads and answer every query from there.
+Content in code only changes without a restart while developing (e.g. editing a template), so only with DEBUG on
+is the content checked for changes, and the index refreshed, on every search.
+Each document is fingerprinted, so refreshing the index only re-indexes documents whose content changed.
+"""
+import hashlib
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.template import Context
+from django.template.loader import get_template
+from django.template.loader_tags import BlockNode
+from django.urls import reverse
+from django.utils.html import strip_tags
+
+WORD_RE = re.compile(r"\w+")
+
+# A search term counts for more when it appears in a document's title
+TITLE_WEIGHT = 3
+TEXT_WEIGHT = 1
+# Matching the start of a word is useful, but a whole word match should rank higher
+PREFIX_WEIGHT = 0.5
+
+
+def tokenize(text):
+    return [word.casefold() for word in WORD_RE.findall(text)]
+
+
+@dataclass
+class Document:
+    key: str
+    title: str
+    url: str
+    text: str = ""
+    summary: str = ""
+    terms: dict = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        for weight, text in ((TITLE_WEIGHT, self.title), (TEXT_WEIGHT, self.text)):
+            for term in tokenize(text):
+                self.terms[term] = self.terms.get(term, 0) + weight
+
+    @property
+    def fingerprint(self):
+        content = "\0".join((self.title, self.url, self.text, self.summary))
+        return hashlib.sha1(content.encode()).hexdigest()
+
+
+class SearchIndex:
+    def __init__(self):
+        self.documents = {}
+        self.fingerprints = {}
+        # term -> {document key: weight}
+        self.postings = defaultdict(dict)
+        # Sorted vocabulary, so every term with a given prefix is one contiguous slice
+        self.vocabulary = []
+        self.version = None
+        # Searches can run in several threads, and must never see an update half done
+        self.lock = threading.RLock()
+
+    def update(self, documents):
+        """Bring the index in line with `documents`, re-indexing only what has changed"""
+        with self.lock:
+            return self._update(documents)
+
+    def _update(self, documents):
+        fingerprints = {document.key: document.fingerprint for document in documents}
+        version = hashlib.sha1(repr(sorted(fingerprints.items())).encode()).hexdigest()
+        if version == self.version:
+            return False
+
+        for key in list(self.documents):
+            if fingerprints.get(key) != self.fingerprints[key]:
+                self.remove(key)
+        for document in documents:
+            if document.key not in self.documents:
+                self.add(document, fingerprints[document.key])
+        self.vocabulary = sorted(self.postings)
+        self.version = version
+        return True
+
+    def add(self, document, fingerprint):
+        self.documents[document.key] = document
+        self.fingerprints[document.key] = fingerprint
+        for term, weight in document.terms.items():
+            self.postings[term][document.key] = weight
+
+    def remove(self, key):
+        document = self.documents.pop(key)
+        del self.fingerprints[key]
+        for term in document.terms:
+            del self.postings[term][key]
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def expand(self, prefix):
+        start = bisect_left(self.vocabulary, prefix)
+        for term in self.vocabulary[start:]:
+            if not term.startswith(prefix):
+                break
+            yield term
+
+    def search(self, query, limit=20):
+        """Return the documents matching every word in `query` (whole word or prefix), best matches first"""
+        with self.lock:
+            return self._search(query, limit)
+
+    def _search(self, query, limit):
+        scores = None
+        for word in dict.fromkeys(tokenize(query)):
+            word_scores = defaultdict(float)
+            for term in self.expand(word):
+                multiplier = 1 if term == word else PREFIX_WEIGHT
+                for key, weight in self.postings[term].items():
+                    word_scores[key] = max(word_scores[key], weight * multiplier)
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {
+                    key: score + word_scores[key]
+                    for key, score in scores.items()
+                    if key in word_scores
+                }
+            if not scores:
+                return []
+        if scores is None:
+            return []
+        ranked = sorted(
+            scores.items(), key=lambda item: (-item[1], self.documents[item[0]].title)
+        )
+        return [self.documents[key] for key, _ in ranked[:limit]]
+
+
+def content_version():
+    """Changes whenever the content collect_documents() reads does, without the cost of collecting it"""
+    from .views import AboutView, MediaView
+
+    content = (
+        MediaView.extra_context["stories"],
+        AboutView.TESTIMONIAL_PHOTOS,
+        get_template("public/recipes.html").template.source,
+    )
+    return hashlib.sha1(repr(content).encode()).hexdigest()
+
+
+def collect_documents():
+    # Imported here since the views module is the source of content, not a dependency of searching
+    from .views import AboutView, MediaView
+
+    documents = []
+    for story in MediaView.extra_context["stories"]:
+        byline = " · ".join(filter(None, (story["author"], story["outlet"])))
+        documents.append(
+            Document(
+                key=f"story:{story['link']}",
+                title=story["title"],
+                url=story["link"],
+                text=f"{story['author']} {story['outlet']} {story['alt_text']}",
+                summary=byline,
+            )
+        )
+
+    about_url = reverse("public:about")
+    for testimonial in AboutView.TESTIMONIAL_PHOTOS:
+        title, _, text = testimonial["alt_text"].partition(": ")
+        documents.append(
+            Document(
+                key=f"testimonial:{testimonial['source']}",
+                title=title,
+                url=about_url,
+                text=text,
+                summary=text,
+            )
+        )
+
+    # Index the cookbook page's own copy, so it stays in sync with what's on the page
+    template = get_template("public/recipes.html").template
+    [content] = [
+        node
+        for node in template.nodelist.get_nodes_by_type(BlockNode)
+        if node.name == "content"
+    ]
+    text = " ".join(strip_tags(content.nodelist.render(Context())).split())
+    documents.append(
+        Document(
+            key="page:recipes",
+            title="Community Cookbook",
+            url=reverse("public:recipes"),
+            text=f"recipes {text}",
+            summary=text,
+        )
+    )
+    return documents
+
+
+index = SearchIndex()
+indexed_content_version = None
+
+
+def refresh_index():
+    """Build the index, or bring it up to date if the content has changed since it was built"""
+    global indexed_content_version
+    version = content_version()
+    if version != indexed_content_version:
+        # Held while collecting too, so concurrent searches don't all collect the same documents
+        with index.lock:
+            if version != indexed_content_version:
+                index.update(collect_documents())
+                indexed_content_version = version
+    return index
+
+
+def get_index():
+    # Fingerprinting the content costs several times more than a search, so only do it when it can change
+    if indexed_content_version is None or settings.DEBUG:
+        return refresh_index()
+    return index
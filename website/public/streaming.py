@@ -0,0 +1,93 @@
+"""
+Streaming template rendering
+
+Normally a page is rendered completely into memory before the first byte is sent, so the browser can't start
+fetching stylesheets from the <head> until the whole body has rendered. Here we render the root template's
+top-level nodes one at a time, so the head goes out straight away and each body block follows as it completes.
+"""
+from django.http import StreamingHttpResponse
+from django.template.context import make_context
+from django.template.loader import select_template
+from django.template.loader_tags import (
+    BLOCK_CONTEXT_KEY,
+    BlockContext,
+    BlockNode,
+    ExtendsNode,
+)
+from django.template.base import TextNode
+from django.views.generic import TemplateView
+
+
+def render_nodes(nodelist, context):
+    """Yield (output, is_block) for each top-level node, descending into the templates being extended"""
+    for node in nodelist:
+        if isinstance(node, ExtendsNode):
+            yield from render_extends(node, context)
+        else:
+            yield node.render_annotated(context), isinstance(node, BlockNode)
+
+
+def render_extends(node, context):
+    # The same as ExtendsNode.render, except the parent's nodes are yielded instead of joined
+    compiled_parent = node.get_parent(context)
+    if BLOCK_CONTEXT_KEY not in context.render_context:
+        context.render_context[BLOCK_CONTEXT_KEY] = BlockContext()
+    block_context = context.render_context[BLOCK_CONTEXT_KEY]
+    block_context.add_blocks(node.blocks)
+
+    # If the parent doesn't extend another template, its blocks are the defaults
+    for parent_node in compiled_parent.nodelist:
+        if not isinstance(parent_node, TextNode):
+            if not isinstance(parent_node, ExtendsNode):
+                blocks = {
+                    n.name: n
+                    for n in compiled_parent.nodelist.get_nodes_by_type(BlockNode)
+                }
+                block_context.add_blocks(blocks)
+            break
+
+    with context.render_context.push_state(compiled_parent, isolated_context=False):
+        yield from render_nodes(compiled_parent.nodelist, context)
+
+
+def stream_template(template, context):
+    """
+    Like Template.render, but yields the page in chunks as it renders
+
+    A chunk is sent each time one of the root template's blocks completes, along with the text and includes before it.
+    """
+    with context.render_context.push_state(template):
+        with context.bind_template(template):
+            context.template_name = template.name
+            chunk = []
+            for output, is_block in render_nodes(template.nodelist, context):
+                chunk.append(output)
+                if is_block:
+                    yield "".join(chunk)
+                    chunk = []
+            if chunk:
+                yield "".join(chunk)
+
+
+class StreamingTemplateView(TemplateView):
+    """
+    A TemplateView that sends its page in chunks as it renders
+
+    Because the response is rendered after the middleware has run, this is only suitable for pages that
+    don't set cookies while rendering: no forms ({% csrf_token %}) and no {% bootstrap_messages %}.
+    """
+
+    stream = True
+
+    def render_to_response(self, context, **response_kwargs):
+        if not self.stream:
+            return super().render_to_response(context, **response_kwargs)
+        template = select_template(self.get_template_names()).template
+        response = StreamingHttpResponse(
+            stream_template(template, make_context(context, self.request)),
+            content_type="text/html; charset=utf-8",
+            **response_kwargs,
+        )
+        # Lets middleware see which template the response came from, like a TemplateResponse
+        response.template_name = template.name
+        return response
@@ -0,0 +1,85 @@
+"""
+Surrogate keys for a caching proxy in front of the site
+
+Each public response is tagged (in the SURROGATE_KEY_HEADER header) with keys naming the content it was built from:
+every template in its tree, the content its view declares in `surrogate_keys`, and the static files (whose hashed
+names depend on the manifest). That lets the proxy cache pages for a long time, since `manage.py purge` can
+purge exactly the pages whose content has changed by purging those keys.
+Responses marked Cache-Control: private (like the about page, with its random photos) aren't tagged.
+
+Each key has a fingerprint of its content, and the purge command compares them with the fingerprints from the
+last purge to find the keys that changed.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.views.generic import TemplateView
+
+from .assets import template_names
+
+STATIC_KEY = "static"
+STORIES_KEY = "stories"
+TESTIMONIALS_KEY = "testimonials"
+
+
+def template_key(template_name):
+    return f"template:{template_name}"
+
+
+def fingerprint(value):
+    return hashlib.sha1(repr(value).encode()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def template_keys(template_name):
+    return [template_key(name) for name in template_names(template_name)]
+
+
+def response_keys(view_class, response):
+    """The surrogate keys for a response from a view"""
+    keys = [STATIC_KEY, *getattr(view_class, "surrogate_keys", [])]
+    names = getattr(response, "template_name", None) or []
+    if isinstance(names, str):
+        names = [names]
+    for template_name in names:
+        try:
+            keys.extend(template_keys(template_name))
+        except TemplateDoesNotExist:
+            continue
+        break
+    return sorted(set(keys))
+
+
+def content():
+    # Imported here since the views module is the source of content, not a dependency of tagging
+    from .views import AboutView, MediaView
+
+    return {
+        STORIES_KEY: MediaView.extra_context["stories"],
+        TESTIMONIALS_KEY: AboutView.TESTIMONIAL_PHOTOS,
+    }
+
+
+def page_views():
+    from .urls import urlpatterns
+
+    for pattern in urlpatterns:
+        view_class = getattr(pattern.callback, "view_class", None)
+        if view_class and issubclass(view_class, TemplateView):
+            yield view_class
+
+
+def fingerprints():
+    """{key: fingerprint} for every key a public page can be tagged with"""
+    result = {key: fingerprint(value) for key, value in content().items()}
+    # The manifest maps each static file to its hashed name, so it changes whenever a file's content does
+    result[STATIC_KEY] = fingerprint(
+        sorted(getattr(staticfiles_storage, "hashed_files", {}).items())
+    )
+    for view_class in page_views():
+        for name in template_names(view_class.template_name):
+            result[template_key(name)] = fingerprint(get_template(name).template.source)
+    return result
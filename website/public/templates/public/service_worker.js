@@ -0,0 +1,59 @@
+// Generated by `manage.py build_service_worker`, don't edit the built sw.js by hand
+// Static assets are precached under a name derived from their hashed filenames, so the cache is only
+// replaced when an asset actually changes. Public pages are served stale-while-revalidate from a cache
+// named for the deploy. Caches from earlier deploys are deleted once the new worker activates.
+
+const PRECACHE = "precache-{{ precache_version }}";
+const PAGES = "pages-{{ pages_version }}";
+const PRECACHE_URLS = {{ precache_urls|safe }};
+const PAGE_URLS = {{ page_urls|safe }};
+
+self.addEventListener("install", (event) => {
+  event.waitUntil(
+    caches.open(PRECACHE)
+      .then((cache) => cache.addAll(PRECACHE_URLS))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then((names) => Promise.all(
+        names
+          .filter((name) => name !== PRECACHE && name !== PAGES)
+          .map((name) => caches.delete(name))
+      ))
+      .then(() => self.clients.claim())
+  );
+});
+
+function staleWhileRevalidate(event) {
+  return caches.open(PAGES).then((cache) => cache.match(event.request).then((cached) => {
+    const fetched = fetch(event.request).then((response) => {
+      if (response.ok && response.type === "basic") {
+        cache.put(event.request, response.clone());
+      }
+      return response;
+    });
+    if (cached) {
+      event.waitUntil(fetched.catch(() => {}));
+      return cached;
+    }
+    return fetched;
+  }));
+}
+
+self.addEventListener("fetch", (event) => {
+  const url = new URL(event.request.url);
+  if (event.request.method !== "GET" || url.origin !== self.location.origin) {
+    return;
+  }
+  if (PRECACHE_URLS.includes(url.pathname)) {
+    event.respondWith(
+      caches.match(event.request).then((cached) => cached || fetch(event.request))
+    );
+  } else if (event.request.mode === "navigate" && !url.search && PAGE_URLS.includes(url.pathname)) {
+    event.respondWith(staleWhileRevalidate(event));
+  }
+});
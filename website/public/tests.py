@@ -1,5 +1,25 @@
+import json
+import re
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.http import StreamingHttpResponse
+from django.middleware.gzip import GZipMiddleware
 from django.urls import reverse
-from django.test import TestCase
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from core.testing import LocalServer, QuietHandler
+
+from .assets import static_paths
+from . import minify
+from .minify import minify_chunks, minify_html
+from .models import SurrogateKey
+from .search import Document, SearchIndex, content_version, get_index
+from .surrogate import STORIES_KEY, fingerprints
+from .views import AboutView, IndexView, MediaView
 
 
 class IndexViewTest(TestCase):
@@ -11,3 +31,377 @@ class IndexViewTest(TestCase):
             response,
             "Founded in response to COVID-19, we provide homecooked meals and grocery care packages to those struggling with food insecurity.",
         )
+
+
+class SearchIndexTest(SimpleTestCase):
+    def make_index(self):
+        index = SearchIndex()
+        index.update(
+            [
+                Document("a", "Solidarity, not charity", "/a", "Toronto Star"),
+                Document("b", "Food is love", "/b", "Solidarity with neighbours"),
+                Document("c", "Community Cookbook", "/c", "Recipes from volunteers"),
+            ]
+        )
+        return index
+
+    def test_ranks_title_matches_first(self):
+        results = self.make_index().search("solidarity")
+        self.assertEqual([document.key for document in results], ["a", "b"])
+
+    def test_prefix_matching(self):
+        index = self.make_index()
+        self.assertEqual(
+            [document.key for document in index.search("solid")], ["a", "b"]
+        )
+        self.assertEqual(
+            [document.key for document in index.search("volun reci")], ["c"]
+        )
+        self.assertEqual(index.search("solidarity recipes"), [])
+        self.assertEqual(index.search(""), [])
+
+    def test_incremental_update(self):
+        index = self.make_index()
+        unchanged = index.documents["a"]
+        self.assertFalse(index.update(list(index.documents.values())))
+
+        changed = Document("b", "Food is love", "/b", "Feeding Toronto")
+        self.assertTrue(index.update([unchanged, changed]))
+        self.assertIs(index.documents["a"], unchanged)
+        self.assertNotIn("c", index.documents)
+        self.assertNotIn("neighbours", index.postings)
+        self.assertCountEqual(
+            [document.key for document in index.search("toronto")], ["a", "b"]
+        )
+
+    def test_indexes_site_content(self):
+        index = get_index()
+        self.assertEqual(
+            index.search("blogto")[0].url,
+            "https://www.blogto.com/eat_drink/2021/01/peoples-pantry-toronto-provides-free-home-cooked-meals-those-need/",
+        )
+        self.assertEqual(index.search("crystal")[0].url, reverse("public:about"))
+        self.assertEqual(index.search("cookbook")[0].url, reverse("public:recipes"))
+
+    def test_built_when_the_app_loads(self):
+        with mock.patch("public.search.collect_documents") as collect_documents:
+            self.assertTrue(get_index().search("huffpo"))
+        collect_documents.assert_not_called()
+
+    def test_only_checks_for_changes_when_debugging(self):
+        with mock.patch(
+            "public.search.content_version", wraps=content_version
+        ) as version:
+            get_index()
+            version.assert_not_called()
+            with override_settings(DEBUG=True):
+                get_index()
+            version.assert_called_once()
+
+    @override_settings(DEBUG=True)
+    def test_refreshes_when_content_changes(self):
+        get_index()
+        story = {**MediaView.extra_context["stories"][0], "title": "Zucchini bread"}
+        stories = [story, *MediaView.extra_context["stories"][1:]]
+        with mock.patch.dict(MediaView.extra_context, stories=stories):
+            self.assertEqual(get_index().search("zucchini")[0].title, "Zucchini bread")
+        self.assertEqual(get_index().search("zucchini"), [])
+
+
+class SearchViewTest(TestCase):
+    def test_search(self):
+        response = self.client.get(reverse("public:search"), {"q": "huffpo"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Free Food to Torontonians")
+
+    def test_no_results(self):
+        response = self.client.get(reverse("public:search"), {"q": "zzzz"})
+        self.assertContains(response, "No results")
+
+
+class StaticAssetsTest(SimpleTestCase):
+    def test_follows_includes(self):
+        paths = static_paths("layout.html")
+        # From layout.html itself, _styles.html, nav.html and _javascript.html
+        self.assertIn("favicon.ico", paths)
+        self.assertIn("landkit_theme/css/theme.min.css", paths)
+        self.assertIn("logo-black.png", paths)
+        self.assertIn("landkit_theme/js/theme.min.js", paths)
+        self.assertNotIn("chef.svg", paths)
+
+
+class ServiceWorkerTest(TestCase):
+    def setUp(self):
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        self.static_root = Path(static_root.name)
+        settings_override = override_settings(STATIC_ROOT=self.static_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_not_built(self):
+        response = self.client.get(reverse("public:service_worker"))
+        self.assertEqual(response.status_code, 404)
+
+    def test_build_and_serve(self):
+        call_command("build_service_worker", stdout=StringIO())
+        response = self.client.get(reverse("public:service_worker"))
+        self.assertEqual(response["Content-Type"], "application/javascript")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+        content = response.content.decode()
+        precache = json.loads(
+            re.search(r"PRECACHE_URLS = (\[.*?\]);", content, re.S).group(1)
+        )
+        self.assertIn("/static/landkit_theme/css/theme.min.css", precache)
+        self.assertIn(
+            "/static/landkit_theme/fonts/HK%20Grotesk%20Pro/HKGroteskPro-Bold.woff2",
+            precache,
+        )
+        self.assertNotIn("/static/splash.jpg", precache)
+        self.assertIn(
+            'const PAGE_URLS = ["/", "/media", "/about", "/recipes"];', content
+        )
+
+
+class PreloadMiddlewareTest(TestCase):
+    def test_preloads_critical_assets(self):
+        response = self.client.get(reverse("public:media"))
+        links = response["Link"].split(", ")
+        self.assertIn(
+            "</static/landkit_theme/css/theme.min.css>; rel=preload; as=style", links
+        )
+        self.assertIn(
+            '</static/landkit_theme/fonts/HK%20Grotesk%20Pro/HKGroteskPro-Bold.woff2>; rel=preload; as=font; type="font/woff2"; crossorigin',
+            links,
+        )
+        # Only stylesheets and fonts block the first render
+        # Scripts, images and fallback fonts would only compete with them
+        for link in links:
+            self.assertRegex(link, r"\.(css|woff2)>; rel=preload; as=(style|font)")
+
+    def test_skips_responses_without_templates(self):
+        response = self.client.get(reverse("public:logo"))
+        self.assertNotIn("Link", response)
+
+
+class StreamingTemplateViewTest(TestCase):
+    def test_streams_the_same_page(self):
+        for view_class in (IndexView, AboutView):
+            with self.subTest(view_class.__name__):
+                # Use the same "random" photos for both renders
+                with mock.patch("random.sample", lambda population, k: population[:k]):
+                    request = RequestFactory().get("/")
+                    streamed = view_class.as_view()(request)
+                    buffered = view_class.as_view(stream=False)(request).render()
+                    chunks = list(streamed.streaming_content)
+
+                self.assertIsInstance(streamed, StreamingHttpResponse)
+                self.assertEqual(b"".join(chunks), buffered.content)
+                # The head is sent before the rest of the page is rendered
+                self.assertIn(b"<head>", chunks[0])
+                self.assertGreater(len(chunks), 5)
+
+    def test_compatible_with_middleware(self):
+        response = self.client.get(reverse("public:about"))
+        self.assertTrue(response.streaming)
+        self.assertIn("Content-Security-Policy", response)
+        self.assertIn("Link", response)
+
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")
+        response = GZipMiddleware(IndexView.as_view())(request)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertTrue(response.streaming)
+
+
+class MinifyTest(SimpleTestCase):
+    html = """
+        <div>
+          <!-- A comment -->
+          <p>Some   text</p>
+          <pre>  keep
+    this </pre>
+          <script>
+            var  a = "  b  ";
+          </script>
+          <style> p  { color: red } </style>
+          <TEXTAREA>  as   typed </TEXTAREA>
+          <!--[if IE]><p>Old browser</p><![endif]-->
+        </div>
+    """
+
+    def test_minify(self):
+        minified = minify_html(self.html)
+        self.assertNotIn("A comment", minified)
+        self.assertIn("\n<p>Some text</p>\n", minified)
+        for preserved in (
+            "<pre>  keep\n    this </pre>",
+            '<script>\n            var  a = "  b  ";\n          </script>',
+            "<style> p  { color: red } </style>",
+            "<TEXTAREA>  as   typed </TEXTAREA>",
+            "<!--[if IE]><p>Old browser</p><![endif]-->",
+        ):
+            self.assertIn(preserved, minified)
+
+    def test_preserves_attribute_values(self):
+        html = (
+            '<img  alt="carry some  of\n  the weight"\n     src="a.png">'
+            "<input value='two  spaces' title=\"a > b\">  <p   class=x>"
+        )
+        self.assertEqual(
+            minify_html(html),
+            '<img alt="carry some  of\n  the weight"\nsrc="a.png">'
+            "<input value='two  spaces' title=\"a > b\"> <p class=x>",
+        )
+
+    def test_memoized(self):
+        with mock.patch.object(minify, "minify", wraps=minify.minify) as mock_minify:
+            first = minify_html(self.html + "<p>memoized</p>")
+            second = minify_html(self.html + "<p>memoized</p>")
+        self.assertEqual(first, second)
+        self.assertEqual(mock_minify.call_count, 1)
+
+    def test_chunks(self):
+        # However the page is split up, streaming gives the same result
+        for size in (1, 7, 50):
+            with self.subTest(size=size):
+                chunks = re.findall(f".{{1,{size}}}", self.html, re.DOTALL)
+                self.assertEqual("".join(minify_chunks(chunks)), minify_html(self.html))
+
+    def test_leaves_unclosed_elements(self):
+        self.assertEqual(
+            minify_html("<p>  a  </p><script>  b  "), "<p> a </p><script>  b  "
+        )
+
+
+class MinifyHTMLMiddlewareTest(TestCase):
+    def test_minifies_pages(self):
+        for name in ("public:index", "public:media"):
+            with self.subTest(name):
+                response = self.client.get(reverse(name))
+                content = b"".join(response)
+                self.assertIn(b"<title>", content)
+                self.assertNotIn(b"<!-- Brand -->", content)
+                # Nothing before the first script is indented
+                self.assertNotRegex(content.split(b"<script")[0], rb"\n[ \t]+<")
+
+    def test_report(self):
+        stdout = StringIO()
+        call_command("minify_report", stdout=stdout)
+        output = stdout.getvalue()
+        for url in ("/ ", "/media", "/about", "/recipes", "/search", "Total"):
+            self.assertIn(url, output)
+
+
+class FakeProxy(LocalServer):
+    """A local stand-in for a caching proxy, which evicts pages tagged with the keys in a PURGE request"""
+
+    def __init__(self, status=200):
+        self.status = status
+        # path -> surrogate keys of the cached page
+        self.pages = {}
+        self.purges = []
+        proxy = self
+
+        class Handler(QuietHandler):
+            def do_PURGE(self):
+                keys = set(self.headers["Surrogate-Key"].split())
+                proxy.purges.append(keys)
+                if proxy.status == 200:
+                    proxy.pages = {
+                        path: page_keys
+                        for path, page_keys in proxy.pages.items()
+                        if not page_keys & keys
+                    }
+                self.send_response(proxy.status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        super().__init__(Handler)
+
+    def cache(self, client, *paths):
+        for path in paths:
+            response = client.get(path)
+            self.pages[path] = set(response["Surrogate-Key"].split())
+
+
+class SurrogateKeyTest(TestCase):
+    def test_tags_public_pages(self):
+        keys = self.client.get(reverse("public:media"))["Surrogate-Key"].split()
+        for key in (
+            "template:public/media.html",
+            "template:full_width_base.html",
+            "template:footer.html",
+            "stories",
+            "static",
+        ):
+            self.assertIn(key, keys)
+        self.assertNotIn("testimonials", keys)
+
+        keys = self.client.get(reverse("public:search"))["Surrogate-Key"].split()
+        self.assertIn("testimonials", keys)
+        self.assertIn("template:public/recipes.html", keys)
+
+        # The random photos on the about page mean it can't be shared
+        response = self.client.get(reverse("public:about"))
+        self.assertEqual(response["Cache-Control"], "private")
+        self.assertNotIn("Surrogate-Key", response)
+
+        response = self.client.get(reverse("public:logo"))
+        self.assertNotIn("Surrogate-Key", response)
+
+    def test_fingerprints(self):
+        self.assertIn("template:layout.html", fingerprints())
+        original = fingerprints()[STORIES_KEY]
+        with mock.patch.dict(MediaView.extra_context, stories=[]):
+            self.assertNotEqual(fingerprints()[STORIES_KEY], original)
+
+
+class PurgeCommandTest(TestCase):
+    def purge(self, proxy, *args):
+        stdout = StringIO()
+        backend = {
+            "BACKEND": "public.purge.HTTPPurgeBackend",
+            "OPTIONS": {"url": proxy.url, "batch_size": 10},
+        }
+        with override_settings(PURGE_BACKEND=backend):
+            call_command("purge", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_purges_changed_content(self):
+        paths = ["/", "/media", "/recipes", "/search?q=food"]
+        with FakeProxy() as proxy:
+            # Nothing has been purged before, so everything might be stale
+            proxy.cache(self.client, *paths)
+            self.purge(proxy)
+            self.assertEqual(proxy.pages, {})
+            self.assertEqual(
+                SurrogateKey.objects.count(), len(set().union(*proxy.purges))
+            )
+
+            proxy.cache(self.client, *paths)
+            proxy.purges.clear()
+            self.assertIn("Nothing to purge", self.purge(proxy))
+            self.assertEqual(proxy.purges, [])
+
+            stories = MediaView.extra_context["stories"][1:]
+            with mock.patch.dict(MediaView.extra_context, stories=stories):
+                self.purge(proxy)
+            self.assertEqual(proxy.purges, [{"stories"}])
+            self.assertEqual(set(proxy.pages), {"/", "/recipes"})
+
+    def test_explicit_keys(self):
+        with FakeProxy() as proxy:
+            proxy.cache(self.client, "/", "/search?q=food")
+            self.assertIn("Dry run", self.purge(proxy, "--dry-run", "testimonials"))
+            self.assertEqual(proxy.purges, [])
+            self.purge(proxy, "testimonials")
+            self.assertEqual(set(proxy.pages), {"/"})
+
+    def test_failure(self):
+        with FakeProxy(status=500) as proxy:
+            with self.assertRaises(CommandError):
+                self.purge(proxy, "--all")
+            # Nothing was recorded as purged, so the next run tries again
+            self.assertFalse(SurrogateKey.objects.exists())
+            self.assertGreater(len(proxy.purges), 0)
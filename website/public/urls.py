@@ -8,7 +8,9 @@ urlpatterns = [
     path("media", views.MediaView.as_view(), name="media"),
     path("about", views.AboutView.as_view(), name="about"),
     path("recipes", views.RecipesView.as_view(), name="recipes"),
+    path("search", views.SearchView.as_view(), name="search"),
     path("community-cookbook", RedirectView.as_view(url=reverse_lazy("public:recipes"))),
+    path("sw.js", views.service_worker, name="service_worker"),
     # Stable redirect url to our (hashed) logo url
     path("logo", views.logo, name="logo"),
     path("community-cookbook-pdf", views.community_cookbook, name="community_cookbook_pdf"),
@@ -1,9 +1,18 @@
 import random
 from datetime import date
+from pathlib import Path
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import redirect
 from django.templatetags.static import static
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
 from django.views.generic import TemplateView
 
+from .search import get_index
+from .streaming import StreamingTemplateView
+from .surrogate import STORIES_KEY, TESTIMONIALS_KEY, template_key
+
 
 def logo(request):
     return redirect(static("logo-black.png"))
@@ -13,12 +22,30 @@ def community_cookbook(request):
     return redirect(static("The-Peoples-Pantry-Cookbook.pdf"))
 
 
-class IndexView(TemplateView):
+def service_worker_path():
+    return Path(settings.STATIC_ROOT) / "sw.js"
+
+
+# The service worker is built by `manage.py build_service_worker` after collectstatic
+# It's served from here rather than /static/ because a worker can only control pages below its own URL
+def service_worker(request):
+    try:
+        content = service_worker_path().read_text()
+    except FileNotFoundError:
+        raise Http404("The service worker hasn't been built")
+    response = HttpResponse(content, content_type="application/javascript")
+    # Browsers should always check for a new worker, it's what tells them a deploy happened
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+class IndexView(StreamingTemplateView):
     template_name = "public/index.html"
 
 
 class MediaView(TemplateView):
     template_name = "public/media.html"
+    surrogate_keys = [STORIES_KEY]
     extra_context = {
         "stories": sorted(
             [
@@ -146,7 +173,9 @@ class MediaView(TemplateView):
     }
 
 
-class AboutView(TemplateView):
+# Each visit shows a different random selection of volunteer photos, which a shared cache would freeze
+@method_decorator(cache_control(private=True), name="dispatch")
+class AboutView(StreamingTemplateView):
     template_name = "public/about.html"
     TESTIMONIAL_PHOTOS = [
         {
@@ -300,3 +329,21 @@ class AboutView(TemplateView):
 
 class RecipesView(TemplateView):
     template_name = "public/recipes.html"
+
+
+class SearchView(TemplateView):
+    template_name = "public/search.html"
+    # Everything in the search index
+    surrogate_keys = [
+        STORIES_KEY,
+        TESTIMONIALS_KEY,
+        template_key("public/recipes.html"),
+    ]
+
+    def get_context_data(self, **kwargs):
+        query = self.request.GET.get("q", "").strip()
+        return super().get_context_data(
+            query=query,
+            results=get_index().search(query) if query else [],
+            **kwargs,
+        )
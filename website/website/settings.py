@@ -14,6 +14,7 @@ import logging
 from os import getenv
 from pathlib import Path
 
+import dj_database_url
 import django_heroku
 import sentry_sdk
 from sentry_sdk.integrations.django import DjangoIntegration
@@ -65,7 +66,8 @@ INSTALLED_APPS = [
     "django.contrib.sites",
     "django_extensions",
     "bootstrap4",
-    "public",
+    "core.apps.CoreConfig",
+    "public.apps.PublicConfig",
     "landkit_theme",
 ]
 MIDDLEWARE = [
@@ -77,6 +79,9 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "csp.middleware.CSPMiddleware",
+    "public.middleware.PreloadMiddleware",
+    "public.middleware.SurrogateKeyMiddleware",
+    "public.middleware.MinifyHTMLMiddleware",
 ]
 ROOT_URLCONF = "website.urls"
 TEMPLATES = [
@@ -91,6 +96,7 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
                 "core.context_processors.settings",
+                "core.context_processors.capacity",
             ],
         },
     },
@@ -109,6 +115,18 @@ DATABASES = {
     }
 }
 
+# Caches
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# Shared by every worker and kept across restarts, which the cached intake capacity totals rely on
+# The table is created by `manage.py createcachetable` (run on release)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "django_cache",
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -229,6 +247,29 @@ EXPLORER_DEFAULT_CONNECTION = "default"
 EXPLORER_PERMISSION_VIEW = lambda request: request.user.is_staff
 EXPLORER_PERMISSION_CHANGE = lambda request: request.user.is_superuser
 
+# Streaming exports (see core/exports.py)
+# Cached results are capped so that caching never means holding a huge export in memory
+EXPORT_CACHE_MAX_ROWS = int(getenv("EXPORT_CACHE_MAX_ROWS", 5000))
+
+# Caching proxy/CDN in front of the site (see public/surrogate.py)
+# Public pages are tagged with surrogate keys in this header, and `manage.py purge` purges them through PURGE_BACKEND
+SURROGATE_KEY_HEADER = getenv("SURROGATE_KEY_HEADER", "Surrogate-Key")
+PURGE_URL = getenv("PURGE_URL")
+PURGE_TOKEN = getenv("PURGE_TOKEN")
+PURGE_HEADERS = {"Authorization": f"Bearer {PURGE_TOKEN}"} if PURGE_TOKEN else {}
+if PURGE_URL:
+    PURGE_BACKEND = {
+        "BACKEND": "public.purge.HTTPPurgeBackend",
+        "OPTIONS": {
+            "url": PURGE_URL,
+            "method": getenv("PURGE_METHOD", "PURGE"),
+            "header": SURROGATE_KEY_HEADER,
+            "headers": PURGE_HEADERS,
+        },
+    }
+else:
+    PURGE_BACKEND = {"BACKEND": "public.purge.DummyPurgeBackend"}
+
 
 # django_heroku
 # https://devcenter.heroku.com/articles/django-app-configuration
@@ -239,6 +280,37 @@ if not getenv_bool("CI"):
     django_heroku.settings(locals())
 
 
+# Database connections
+# django_heroku keeps connections open between requests (CONN_MAX_AGE) so requests don't pay for
+# connection setup. Our Postgres backend also checks a reused connection is still alive before using it
+# If REPLICA_DATABASE_URL is set, reporting queries (SQL Explorer, exports) are read from the replica
+
+DATABASE_CONN_MAX_AGE = int(getenv("DATABASE_CONN_MAX_AGE", 600))
+POSTGRES_ENGINES = (
+    "django.db.backends.postgresql",
+    "django.db.backends.postgresql_psycopg2",
+)
+if DATABASES["default"]["ENGINE"] in POSTGRES_ENGINES:
+    DATABASES["default"].update(
+        ENGINE="core.db.postgresql",
+        CONN_MAX_AGE=DATABASE_CONN_MAX_AGE,
+        CONN_HEALTH_CHECKS=True,
+    )
+
+REPLICA_DATABASE_URL = getenv("REPLICA_DATABASE_URL")
+if REPLICA_DATABASE_URL:
+    DATABASES["replica"] = dj_database_url.parse(
+        REPLICA_DATABASE_URL, conn_max_age=DATABASE_CONN_MAX_AGE, ssl_require=True
+    )
+    DATABASES["replica"].update(
+        ENGINE="core.db.postgresql",
+        CONN_HEALTH_CHECKS=True,
+        TEST={"MIRROR": "default"},
+    )
+    EXPLORER_CONNECTIONS["Replica"] = "replica"
+    EXPLORER_DEFAULT_CONNECTION = "replica"
+
+
 # Maps API keys
 # https://developer.mapquest.com/documentation/
 # https://developers.google.com/maps/documentation
@@ -253,6 +325,10 @@ GOOGLE_MAPS_PRODUCTION_KEY = getenv("GOOGLE_MAPS_API_KEY")
 # Credentials maintained in 1Password
 
 TEXTLINE_ACCESS_TOKEN = getenv("TEXTLINE_ACCESS_TOKEN")
+TEXTLINE_API_URL = getenv("TEXTLINE_API_URL", "https://application.textline.com/api/")
+# Maximum messages per second, and maximum messages in flight at once, for bulk sends
+TEXTLINE_RATE_LIMIT = float(getenv("TEXTLINE_RATE_LIMIT", 5))
+TEXTLINE_CONCURRENCY = int(getenv("TEXTLINE_CONCURRENCY", 4))
 
 
 # Custom application settings
@@ -279,6 +355,20 @@ DISABLE_GROCERIES = getenv_bool("DISABLE_GROCERIES", False)
 MEALS_LIMIT = 45
 DISABLE_MEALS_PERIOD = getenv_bool("DISABLE_MEALS_PERIOD", False)
 
+# Intake is tracked with counters in the database, see core/capacity.py
+# "source" is an optional dotted path to a function(start_date, end_date) returning {date: count}
+# from the database, which `manage.py reconcile_capacity` uses to correct the counters
+INTAKE_CAPACITY = {
+    "meals": {
+        "limit": MEALS_LIMIT,
+        "disabled": DISABLE_MEALS_PERIOD,
+    },
+    "groceries": {
+        "limit": GROCERIES_LIMIT,
+        "disabled": DISABLE_GROCERIES_PERIOD or DISABLE_GROCERIES,
+    },
+}
+
 # Settings for figuring out delivery distances
 MAX_CHEF_DISTANCE = (
     10  # Chefs can't be more than this many km away from their recipients
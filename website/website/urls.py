@@ -23,4 +23,5 @@ admin.site.site_title = "The People's Pantry admin"
 
 urlpatterns = [
     path("", include("public.urls")),
+    path("reports/", include("core.urls")),
 ]